@@ -3,6 +3,12 @@ import os
 import sys
 import argparse
 import csv
+import io
+import shutil
+import tempfile
+import threading
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor
 
 # --- Config ---
 DB_FILE = "oncology_data.db"
@@ -13,114 +19,227 @@ DEFAULT_QUERY_FILES = [
     "ovarian_ca125_trends.sql"
 ]
 RESULTS_FOLDER = "results"
+FETCH_SIZE = 1024 # Rows per fetchmany() chunk when streaming results
+CSV_WRITE_BUFFER = 1 << 20 # 1 MiB file buffer for CSV output
+OUTPUT_SPOOL_SIZE = 1 << 20 # Per-query console buffer moves to a temp file past 1 MiB
 
-def execute_query(cursor, filepath, limit=None, output_csv=False):
-    """Runs a single SQL query file, prints results or saves to CSV."""
+# Cache of SQL file contents: filepath -> ((mtime_ns, size), sql_text).
+# The file is only re-read when its mtime or size changes.
+_SQL_CACHE = {}
+
+def read_sql(filepath):
+    """Returns the SQL text of a file, re-reading it only if it changed on disk."""
+    st = os.stat(filepath)
+    # Integer ns mtime keeps full precision; size catches rewrites that keep
+    # the old timestamp (coarse-mtime filesystems, cp -p, rsync -t, touch -r)
+    version = (st.st_mtime_ns, st.st_size)
+    cached = _SQL_CACHE.get(filepath)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    with open(filepath, 'rb') as f: # Binary read skips the text-layer machinery
+        sql_query = f.read().decode('utf-8')
+    _SQL_CACHE[filepath] = (version, sql_query)
+    return sql_query
+
+# Reusable CSV staging buffer, one per worker thread
+_CSV_BUFFERS = threading.local()
+
+def get_csv_buffer():
+    """Returns this thread's empty StringIO for staging CSV chunks."""
+    buf = getattr(_CSV_BUFFERS, "buf", None)
+    if buf is None:
+        buf = _CSV_BUFFERS.buf = io.StringIO()
+    buf.seek(0)
+    buf.truncate()
+    return buf
+
+def format_csv_chunk(rows):
+    """Fast comma-join of rows as CSV text, or None if any field needs quoting."""
+    ncols = len(rows[0])
+    if ncols < 2:
+        return None # csv quotes a lone empty field; leave that to csv.writer
+    text = "".join([",".join(["" if v is None else str(v) for v in row]) + "\r\n" for row in rows])
+    # Every comma/line break must be one we added, and no quotes at all
+    n = len(rows)
+    if ('"' in text or text.count(",") != n * (ncols - 1)
+            or text.count("\n") != n or text.count("\r") != n):
+        return None
+    return text
+
+def sql_file_present(filename, present_files):
+    """True if filename is in SQL_FOLDER; present_files is the scandir listing."""
+    # Set lookup is case-sensitive; on a miss let the filesystem decide,
+    # since Windows/macOS match names case-insensitively.
+    return filename in present_files or os.path.exists(os.path.join(SQL_FOLDER, filename))
+
+def connect_db():
+    """Opens the DB read-only, tuned for analytics reads."""
+    # check_same_thread=False: main() opens the pool, worker threads use it
+    conn = sqlite3.connect(f"file:{DB_FILE}?mode=ro", uri=True, check_same_thread=False)
+    conn.executescript(
+        "PRAGMA cache_size=-131072;"   # ~128 MB page cache
+        "PRAGMA temp_store=MEMORY;"    # Sorts/temp b-trees stay in RAM
+        "PRAGMA mmap_size=268435456;"  # Map up to 256 MB, fewer read() calls
+    )
+    return conn
+
+def get_column_names(cursor):
+    """Column names of the last query run on cursor ([] if it returned none)."""
+    return [desc[0] for desc in cursor.description] if cursor.description else []
+
+def execute_query(cursor, filepath, limit=None, output_csv=False, out=None):
+    """Runs a single SQL query file, prints results (to `out`, default stdout) or saves to CSV."""
+    if out is None:
+        out = sys.stdout
     filename = os.path.basename(filepath)
-    print(f"--- Running {filename} ---")
+    print(f"--- Running {filename} ---", file=out)
 
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            sql_query = f.read()
+        sql_query = read_sql(filepath)
+        # Rows must stay plain tuples: they go straight to the writers below
+        # with no per-row conversion, so don't switch this to sqlite3.Row.
+        cursor.row_factory = None
         cursor.execute(sql_query)
-        
-        # Get column names if the query returned anything
-        column_names = [desc[0] for desc in cursor.description] if cursor.description else []
 
         if output_csv:
             # Save results to CSV
-            if not os.path.exists(RESULTS_FOLDER):
-                os.makedirs(RESULTS_FOLDER) # Create results dir if needed
+            os.makedirs(RESULTS_FOLDER, exist_ok=True) # Create results dir if needed
             csv_filename = os.path.splitext(filename)[0] + ".csv"
             csv_filepath = os.path.join(RESULTS_FOLDER, csv_filename)
             
-            with open(csv_filepath, 'w', newline='', encoding='utf-8') as csvfile:
-                writer = csv.writer(csvfile)
+            with open(csv_filepath, 'w', newline='', encoding='utf-8', buffering=CSV_WRITE_BUFFER) as csvfile:
+                buf = get_csv_buffer()
+                writer = csv.writer(buf) # Format into the buffer, flush once per chunk
+                column_names = get_column_names(cursor)
                 if column_names:
                     writer.writerow(column_names) # Write header
+                    csvfile.write(buf.getvalue())
+                cursor.arraysize = FETCH_SIZE # fetchmany() default chunk size
                 fetched_count = 0
-                while True:
-                    rows = cursor.fetchmany(1000) # Fetch in chunks, good for large results
-                    if not rows:
-                        break # No more data
-                    writer.writerows(rows)
+                for rows in iter(cursor.fetchmany, []): # Fetch in chunks until empty
+                    chunk = format_csv_chunk(rows)
+                    if chunk is None: # Some field needs quoting, let csv handle it
+                        buf = get_csv_buffer()
+                        writer.writerows(rows)
+                        chunk = buf.getvalue()
+                    csvfile.write(chunk)
                     fetched_count += len(rows)
-                print(f"Saved to {csv_filepath} ({fetched_count} rows)")
+                print(f"Saved to {csv_filepath} ({fetched_count} rows)", file=out)
 
         else: # Output to console
             # Fetch results - apply limit if specified
-            results = cursor.fetchmany(limit) if limit is not None and limit > 0 else cursor.fetchall()
+            truncated = False
+            more_results = () # Chunks still to stream after the first one
+            if limit is not None and limit > 0:
+                # Grab one extra row up front to learn if there is more
+                results = cursor.fetchmany(limit + 1)
+                truncated = len(results) > limit
+                results = results[:limit]
+            else:
+                # Stream in chunks rather than fetchall(); first chunk tells us if it's empty
+                cursor.arraysize = FETCH_SIZE
+                results = cursor.fetchmany()
+                more_results = iter(cursor.fetchmany, [])
             
             if not results:
-                print("(No results returned or limit=0)")
+                print("(No results returned or limit=0)", file=out)
             else:
                 # Print header
+                column_names = get_column_names(cursor)
                 if column_names:
-                    print(", ".join(column_names))
-                    print("-" * (len(", ".join(column_names)) + 4))
-                # Print rows
-                for row in results:
-                    print(", ".join(map(str, row)))
+                    header = ", ".join(column_names)
+                    out.write(f"{header}\n{'-' * (len(header) + 4)}\n") # Header + underline in one write
+                # Print rows - build each chunk's block, then write it once.
+                # '%s' formatting str()s the whole tuple in C, no per-field map.
+                row_format = ", ".join(["%s"] * len(column_names))
+                for rows in chain([results], more_results):
+                    out.write("\n".join([row_format % row for row in rows]))
+                    out.write("\n")
                 
                 # Check if output was cut short by limit
-                if limit is not None and limit > 0 and len(results) == limit:
-                     # Try fetching one more row to see if there was more
-                     if cursor.fetchone():
-                         # Just indicate more rows exist, getting exact count might be slow
-                         print("... (output limited)") 
-                     # else: fetched exactly the limit
-
-            print(f"--- Done: {filename} ---\n")
+                if truncated:
+                     # Just indicate more rows exist, getting exact count might be slow
+                     print("... (output limited)", file=out)
+
+            print(f"--- Done: {filename} ---\n", file=out)
         return True # Success
 
     except sqlite3.Error as e:
-        print(f"!! SQL Error in {filepath}: {e}")
+        print(f"!! SQL Error in {filepath}: {e}", file=out)
         return False # Failed
     except FileNotFoundError:
-        print(f"!! File not found: {filepath}")
+        print(f"!! File not found: {filepath}", file=out)
         return False # Failed
     except IOError as e:
-        print(f"!! Error writing CSV {csv_filepath}: {e}")
+        print(f"!! Error writing CSV {csv_filepath}: {e}", file=out)
         return False # Failed
     except Exception as e:
-        print(f"!! Unexpected error with {filepath}: {e}")
+        print(f"!! Unexpected error with {filepath}: {e}", file=out)
         return False # Failed
 
-def main():
-    """Main logic: connect to DB, parse args, run queries."""
-    # --- Argument Parsing ---
-    parser = argparse.ArgumentParser(description="Run SQL analysis queries on the oncology DB.")
-    parser.add_argument(
-        "sql_file", 
-        nargs='?', # Makes it optional
-        default=None, 
-        help=f"Optional: Run only this SQL file (name) from '{SQL_FOLDER}/'. Default: run all."
-    )
-    parser.add_argument(
-        "-l", "--limit", 
-        type=int, 
-        default=None, 
-        help="Limit console output rows per query. No effect on CSV."
-    )
-    parser.add_argument(
-        "-c", "--csv", 
-        action="store_true", # Flag, doesn't take a value
-        help=f"Save results to CSV files in '{RESULTS_FOLDER}/' instead of console."
-    )
-    args = parser.parse_args()
+def run_query_buffered(conn, filepath, limit=None, output_csv=False):
+    """Runs execute_query on its own cursor and returns (success, output file rewound to the start).
+
+    The caller must close the returned file.
+    """
+    # Per-query buffer so parallel runs don't interleave; spills to disk
+    # once it grows past OUTPUT_SPOOL_SIZE, so big results don't sit in RAM.
+    out = tempfile.SpooledTemporaryFile(max_size=OUTPUT_SPOOL_SIZE, mode='w+',
+                                        encoding='utf-8', newline='')
+    cursor = conn.cursor()
+    try:
+        success = execute_query(cursor, filepath, limit=limit, output_csv=output_csv, out=out)
+    except BaseException:
+        out.close()
+        raise
+    finally:
+        cursor.close()
+    out.seek(0)
+    return success, out
+
+# --- Argument Parsing ---
+# Built once at import so repeated main() calls reuse it
+_PARSER = argparse.ArgumentParser(description="Run SQL analysis queries on the oncology DB.")
+_PARSER.add_argument(
+    "sql_file", 
+    nargs='?', # Makes it optional
+    default=None, 
+    help=f"Optional: Run only this SQL file (name) from '{SQL_FOLDER}/'. Default: run all."
+)
+_PARSER.add_argument(
+    "-l", "--limit", 
+    type=int, 
+    default=None, 
+    help="Limit console output rows per query. No effect on CSV."
+)
+_PARSER.add_argument(
+    "-c", "--csv", 
+    action="store_true", # Flag, doesn't take a value
+    help=f"Save results to CSV files in '{RESULTS_FOLDER}/' instead of console."
+)
+
+def main(argv=None):
+    """Main logic: connect to DB, parse args (sys.argv if argv is None), run queries."""
+    args = _PARSER.parse_args(argv)
 
     # --- DB and File Checks ---
     if not os.path.exists(DB_FILE):
         print(f"!! Error: DB file '{DB_FILE}' not found here.")
         sys.exit(1)
 
+    # List the SQL folder once instead of stat-ing each file
+    try:
+        with os.scandir(SQL_FOLDER) as entries:
+            present_files = {entry.name for entry in entries if entry.is_file()}
+    except FileNotFoundError:
+        present_files = set()
+
     # Decide which SQL files to run
     query_files_to_run = []
     if args.sql_file:
         # User specified a single file
         filename_only = os.path.basename(args.sql_file) 
-        filepath = os.path.join(SQL_FOLDER, filename_only)
-        if not os.path.exists(filepath):
+        if not sql_file_present(filename_only, present_files):
              print(f"!! Error: File '{filename_only}' not found in '{SQL_FOLDER}/'.")
              sys.exit(1)
         query_files_to_run.append(filename_only)
@@ -128,25 +247,59 @@ def main():
         # Default: run all predefined files
         query_files_to_run = DEFAULT_QUERY_FILES
         
+    # Output goes through print()/sys.stdout rather than logging: print looks
+    # sys.stdout up on every call (so redirect_stdout works on repeated main()
+    # calls) and the host program's logging setup is never touched.
     # --- Run Queries ---
-    conn = None
+    conns = []
     all_successful = True
     try:
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        print(f"Connected to {DB_FILE}\n")
-
+        filepaths = []
         for filename in query_files_to_run:
             filepath = os.path.join(SQL_FOLDER, filename)
-            # Check again? Might be redundant if list is default, but safer.
-            if not os.path.exists(filepath):
+            # Default list isn't checked above, so make sure each file is there
+            if not sql_file_present(filename, present_files):
                  print(f"?? Warning: SQL file '{filepath}' missing? Skipping.")
                  all_successful = False
                  continue
-            # Execute the query, handle output based on args
-            if not execute_query(cursor, filepath, limit=args.limit, output_csv=args.csv):
-                all_successful = False
-                # Keep going even if one fails
+            filepaths.append(filepath)
+
+        # One read-only connection per query file that exists; the queries are independent
+        for _ in filepaths:
+            conns.append(connect_db())
+        if conns:
+            print(f"Connected to {DB_FILE}\n")
+
+            if len(conns) == 1:
+                # Single query: nothing to interleave with, stream straight to stdout
+                cursor = conns[0].cursor()
+                try:
+                    if not execute_query(cursor, filepaths[0], limit=args.limit, output_csv=args.csv):
+                        all_successful = False
+                finally:
+                    cursor.close()
+            else:
+                # Execute the queries in parallel, handle output based on args.
+                # (Not batched via executescript(): it throws away result rows.)
+                with ThreadPoolExecutor(max_workers=len(conns)) as pool:
+                    futures = [
+                        pool.submit(run_query_buffered, conn, filepath, args.limit, args.csv)
+                        for conn, filepath in zip(conns, filepaths)
+                    ]
+                    try:
+                        # Print in submission order so output matches the file order
+                        for future in futures:
+                            success, output = future.result()
+                            with output: # Copy in chunks, never the whole result at once
+                                shutil.copyfileobj(output, sys.stdout)
+                            if not success:
+                                all_successful = False
+                                # Keep going even if one fails
+                    finally:
+                        # If a result raised, later spool files were never read; close them all
+                        for future in futures:
+                            if future.exception() is None: # Waits for the worker to finish
+                                future.result()[1].close()
 
         # --- Wrap up ---
         print("-"*30)
@@ -165,9 +318,10 @@ def main():
         all_successful = False
         # sys.exit(1)
     finally:
-        # Always try to close the connection
-        if conn:
+        # Always try to close the connections
+        for conn in conns:
             conn.close()
+        if conns:
             print("\nDB connection closed.")
         
         # Optional: Exit with non-zero code if anything failed
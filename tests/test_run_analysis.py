@@ -0,0 +1,295 @@
+import unittest
+import sqlite3
+import os
+import sys
+import io
+import csv
+import shutil
+import tempfile
+import logging
+import contextlib
+from unittest import mock
+
+# Make run_analysis.py (project root) importable when run via discover
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import run_analysis
+
+def csv_writer_output(rows):
+    """What csv.writer produces for rows - the reference format_csv_chunk must match."""
+    buf = io.StringIO()
+    csv.writer(buf).writerows(rows)
+    return buf.getvalue()
+
+# --- Test Classes ---
+class TestReadSql(unittest.TestCase):
+    """Checks the mtime/size-keyed SQL file cache."""
+
+    def setUp(self):
+        """Temp SQL file, with its cache entry dropped afterwards."""
+        self.tmpdir = tempfile.mkdtemp()
+        self.filepath = os.path.join(self.tmpdir, "query.sql")
+        self.write("SELECT 1;")
+
+    def tearDown(self):
+        """Forget the temp file in the cache and remove it."""
+        run_analysis._SQL_CACHE.pop(self.filepath, None)
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, sql):
+        """Writes sql to the temp file."""
+        with open(self.filepath, 'w', encoding='utf-8') as f:
+            f.write(sql)
+
+    def test_unchanged_file_is_served_from_cache(self):
+        """A second read of an unchanged file doesn't open it again."""
+        self.assertEqual(run_analysis.read_sql(self.filepath), "SELECT 1;")
+        with mock.patch("builtins.open") as opened:
+            self.assertEqual(run_analysis.read_sql(self.filepath), "SELECT 1;")
+        opened.assert_not_called()
+
+    def test_rewrite_keeping_mtime_is_reread(self):
+        """New content under the old timestamp (cp -p, touch -r) is still picked up."""
+        self.assertEqual(run_analysis.read_sql(self.filepath), "SELECT 1;")
+        st = os.stat(self.filepath)
+        self.write("SELECT 1, 2;")
+        os.utime(self.filepath, ns=(st.st_atime_ns, st.st_mtime_ns))
+        self.assertEqual(run_analysis.read_sql(self.filepath), "SELECT 1, 2;")
+
+
+class TestFormatCsvChunk(unittest.TestCase):
+    """Checks the comma-join fast path against csv.writer."""
+
+    def assertMatchesCsvWriter(self, rows):
+        """Fast path must either give csv.writer's exact bytes or bail out with None."""
+        chunk = run_analysis.format_csv_chunk(rows)
+        if chunk is not None:
+            self.assertEqual(chunk, csv_writer_output(rows))
+        return chunk
+
+    def test_plain_rows_use_fast_path(self):
+        """Plain text/number rows are formatted without csv.writer."""
+        rows = [("p1", "Jose", 1, 13.0), ("p2", "Ann", 2, 0.1)]
+        self.assertIsNotNone(self.assertMatchesCsvWriter(rows))
+
+    def test_fields_needing_quotes_fall_back(self):
+        """Any field csv would quote makes the whole chunk fall back."""
+        for field in ["a,b", 'say "hi"', "line\rbreak", "line\nbreak", "crlf\r\n"]:
+            with self.subTest(field=field):
+                self.assertIsNone(self.assertMatchesCsvWriter([("p1", field)]))
+
+    def test_none_and_empty_string(self):
+        """None and '' are both written as empty fields in multi-column rows."""
+        rows = [("p1", None, ""), (None, "", None)]
+        self.assertIsNotNone(self.assertMatchesCsvWriter(rows))
+
+    def test_floats_and_bytes(self):
+        """Floats and bytes are formatted the same way csv.writer does it."""
+        rows = [(1.5, 1e20, -0.0, 1 / 3), (b"raw", True, 10 ** 20, 2.0)]
+        self.assertIsNotNone(self.assertMatchesCsvWriter(rows))
+
+    def test_single_column_rows_fall_back(self):
+        """Single-column rows always go to csv.writer (it quotes a lone empty field)."""
+        for rows in ([("p1",)], [("",)], [(None,)]):
+            with self.subTest(rows=rows):
+                self.assertIsNone(run_analysis.format_csv_chunk(rows))
+
+    def test_mixed_chunk_falls_back(self):
+        """One bad row among clean ones sends the whole chunk to csv.writer."""
+        rows = [("p1", "Jose")] * 5 + [("p2", "Smith, Jr.")] + [("p3", "Ann")] * 5
+        self.assertIsNone(self.assertMatchesCsvWriter(rows))
+
+
+class TestSqlFilePresent(unittest.TestCase):
+    """Checks the SQL file presence test used by main()."""
+
+    def test_listed_file_skips_stat(self):
+        """A name in the scandir listing is found without touching the disk."""
+        with mock.patch("os.path.exists") as exists:
+            self.assertTrue(run_analysis.sql_file_present("a.sql", {"a.sql"}))
+        exists.assert_not_called()
+
+    def test_miss_defers_to_filesystem(self):
+        """A differently-cased name is found if the filesystem says it exists (Windows/macOS)."""
+        with mock.patch("os.path.exists", return_value=True):
+            self.assertTrue(run_analysis.sql_file_present("A.SQL", {"a.sql"}))
+        with mock.patch("os.path.exists", return_value=False):
+            self.assertFalse(run_analysis.sql_file_present("A.SQL", {"a.sql"}))
+
+
+class TestExecuteQuery(unittest.TestCase):
+    """Runs execute_query against a small in-memory table."""
+
+    ROW_COUNT = 10
+
+    def setUp(self):
+        """In-memory DB with ROW_COUNT rows, plus a temp folder for SQL/CSV files."""
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.execute("CREATE TABLE t (id INTEGER, name TEXT)")
+        self.conn.executemany("INSERT INTO t VALUES (?, ?)",
+                              [(i, f"name {i}") for i in range(self.ROW_COUNT)])
+        self.tmpdir = tempfile.mkdtemp()
+        self.cursor = self.conn.cursor()
+
+    def tearDown(self):
+        """Close DB and remove temp files."""
+        self.cursor.close()
+        self.conn.close()
+        shutil.rmtree(self.tmpdir)
+
+    def write_sql(self, sql, name="query.sql"):
+        """Writes a SQL file into the temp folder, returns its path."""
+        filepath = os.path.join(self.tmpdir, name)
+        with open(filepath, 'w', encoding='utf-8') as f:
+            f.write(sql)
+        return filepath
+
+    def run_console(self, limit):
+        """Runs the test query in console mode, returns the printed text."""
+        filepath = self.write_sql("SELECT id, name FROM t ORDER BY id;")
+        out = io.StringIO()
+        self.assertTrue(run_analysis.execute_query(self.cursor, filepath, limit=limit, out=out))
+        return out.getvalue()
+
+    def test_limit_below_row_count_is_truncated(self):
+        """limit < rows: prints exactly limit rows and the 'output limited' note."""
+        output = self.run_console(limit=3)
+        self.assertIn("2, name 2\n", output)
+        self.assertNotIn("3, name 3", output)
+        self.assertIn("... (output limited)", output)
+
+    def test_limit_equal_to_row_count_is_not_truncated(self):
+        """limit == rows: all rows printed, no 'output limited' note."""
+        output = self.run_console(limit=self.ROW_COUNT)
+        self.assertIn(f"{self.ROW_COUNT - 1}, name {self.ROW_COUNT - 1}\n", output)
+        self.assertNotIn("output limited", output)
+
+    def test_no_limit_prints_every_row(self):
+        """No limit: every row printed, across several fetch chunks."""
+        original_fetch_size = run_analysis.FETCH_SIZE
+        run_analysis.FETCH_SIZE = 3 # Force multiple chunks
+        try:
+            output = self.run_console(limit=None)
+        finally:
+            run_analysis.FETCH_SIZE = original_fetch_size
+        for i in range(self.ROW_COUNT):
+            self.assertIn(f"{i}, name {i}\n", output)
+        self.assertNotIn("output limited", output)
+
+    def test_run_query_buffered_matches_execute_query(self):
+        """run_query_buffered returns a rewound file holding what execute_query prints."""
+        expected = self.run_console(limit=2)
+        success, output = run_analysis.run_query_buffered(
+            self.conn, os.path.join(self.tmpdir, "query.sql"), limit=2)
+        with output:
+            self.assertTrue(success)
+            self.assertEqual(output.read(), expected)
+
+    def test_buffered_output_spills_to_disk(self):
+        """run_query_buffered rolls big output over to a temp file, text unchanged."""
+        expected = self.run_console(limit=None)
+        filepath = os.path.join(self.tmpdir, "query.sql")
+        original_spool_size = run_analysis.OUTPUT_SPOOL_SIZE
+        run_analysis.OUTPUT_SPOOL_SIZE = 16 # Far smaller than the output
+        real_rollover = tempfile.SpooledTemporaryFile.rollover
+        # Spy on rollover (still running the real one) to see the spill happen
+        with mock.patch.object(tempfile.SpooledTemporaryFile, "rollover",
+                               autospec=True, side_effect=real_rollover) as rollover:
+            try:
+                success, output = run_analysis.run_query_buffered(self.conn, filepath)
+            finally:
+                run_analysis.OUTPUT_SPOOL_SIZE = original_spool_size
+        with output:
+            self.assertTrue(success)
+            self.assertTrue(rollover.called, "output should have moved to a temp file")
+            self.assertEqual(output.read(), expected)
+
+    def test_csv_export_matches_csv_writer(self):
+        """CSV export mixing fast and fallback chunks equals plain csv.writer output."""
+        self.conn.execute("UPDATE t SET name = 'needs, quoting' WHERE id = 4")
+        filepath = self.write_sql("SELECT id, name FROM t ORDER BY id;")
+        original = run_analysis.RESULTS_FOLDER, run_analysis.FETCH_SIZE
+        run_analysis.RESULTS_FOLDER = os.path.join(self.tmpdir, "results")
+        run_analysis.FETCH_SIZE = 3 # Chunk with id 4 falls back, the others don't
+        try:
+            self.assertTrue(run_analysis.execute_query(self.cursor, filepath, output_csv=True,
+                                                       out=io.StringIO()))
+        finally:
+            run_analysis.RESULTS_FOLDER, run_analysis.FETCH_SIZE = original
+        with open(os.path.join(self.tmpdir, "results", "query.csv"), newline='', encoding='utf-8') as f:
+            written = f.read()
+        rows = self.conn.execute("SELECT id, name FROM t ORDER BY id").fetchall()
+        self.assertEqual(written, csv_writer_output([("id", "name")] + rows))
+
+
+class TestMain(unittest.TestCase):
+    """Runs main() programmatically against the real DB (run from project root)."""
+
+    def run_main(self, argv):
+        """Calls main(argv) with stdout captured (kept in self.captured), returns the printed text."""
+        self.captured = io.StringIO()
+        with contextlib.redirect_stdout(self.captured):
+            run_analysis.main(argv)
+        return self.captured.getvalue()
+
+    def test_default_run_prints_queries_in_file_order(self):
+        """Queries run in parallel but their blocks print in DEFAULT_QUERY_FILES order."""
+        output = self.run_main(["-l", "1"])
+        positions = [output.index(f"--- Running {name} ---") for name in run_analysis.DEFAULT_QUERY_FILES]
+        self.assertEqual(positions, sorted(positions))
+        self.assertIn("Script finished.", output)
+
+    def test_unknown_sql_file_exits(self):
+        """A file name not in projects/ is reported and main() exits."""
+        with self.assertRaises(SystemExit):
+            self.run_main(["no_such_query.sql"])
+        self.assertIn("!! Error: File 'no_such_query.sql' not found", self.captured.getvalue())
+
+    def test_missing_default_file_is_skipped(self):
+        """A missing file in the default list is warned about; the others still run."""
+        with mock.patch.object(run_analysis, "DEFAULT_QUERY_FILES",
+                               ["crc_folfox_analysis.sql", "no_such_query.sql"]):
+            output = self.run_main(["-l", "1"])
+        self.assertIn("no_such_query.sql' missing? Skipping.", output)
+        self.assertIn("--- Done: crc_folfox_analysis.sql ---", output)
+        self.assertIn("Script finished, but with errors/warnings.", output)
+
+    def test_logging_config_untouched(self):
+        """Guard: output doesn't depend on, or change, the host's logging setup."""
+        root = logging.getLogger()
+        host_handler = logging.NullHandler() # As if the host had configured logging
+        root.addHandler(host_handler)
+        try:
+            handlers, level = list(root.handlers), root.level
+            output = self.run_main(["crc_folfox_analysis.sql", "-l", "1"])
+            self.assertEqual(root.handlers, handlers)
+            self.assertEqual(root.level, level)
+        finally:
+            root.removeHandler(host_handler)
+        self.assertIn("--- Running crc_folfox_analysis.sql ---", output)
+        self.assertIn("Script finished.", output)
+
+    def test_spool_files_closed_when_a_query_raises(self):
+        """If an earlier query blows up, the later queries' spool files still get closed."""
+        real_run = run_analysis.run_query_buffered
+        outputs = []
+        def run_query_buffered(conn, filepath, *args):
+            if filepath.endswith(run_analysis.DEFAULT_QUERY_FILES[0]):
+                raise RuntimeError("boom")
+            success, output = real_run(conn, filepath, *args)
+            outputs.append(output)
+            return success, output
+        with mock.patch.object(run_analysis, "run_query_buffered", run_query_buffered):
+            output = self.run_main(["-l", "1"])
+        self.assertIn("!! Unexpected error in main: boom", output)
+        self.assertEqual(len(outputs), len(run_analysis.DEFAULT_QUERY_FILES) - 1)
+        self.assertTrue(all(o.closed for o in outputs))
+
+    def test_repeated_calls_write_to_current_stdout(self):
+        """main(argv) can be called again and prints to whatever sys.stdout is at that moment."""
+        first = self.run_main(["crc_folfox_analysis.sql", "-l", "1"])
+        second = self.run_main(["crc_folfox_analysis.sql", "-l", "1"])
+        self.assertIn("Script finished.", first)
+        self.assertEqual(first, second)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -24,21 +24,38 @@ EXPECTED_COLUMNS = {
     ]
 }
 
+# Column names per (SQL file, query text), filled in the first time each
+# query is probed; keyed on the text so an edited query is probed again
+_COL_CACHE = {}
+
+def limit_query(sql_query, n):
+    """Wraps a single SELECT query so it returns at most n rows (for the non-empty check)."""
+    # Newline before ')' so a trailing '--' comment can't swallow it
+    return f"SELECT * FROM (\n{sql_query.strip().rstrip(';')}\n) LIMIT {n}"
+
 # --- Test Class ---
 class TestSQLQueries(unittest.TestCase):
     """Tests if the SQL queries in projects/ run and have the right columns."""
 
     conn = None # Share connection across tests in this class
+    sql_texts = {} # SQL file name -> query text, read once in setUpClass
 
     @classmethod
     def setUpClass(cls):
-        """Connect to DB once before running tests in this class."""
+        """Load the DB into memory once before running tests in this class."""
         if not os.path.exists(DB_FILE):
             # Make sure DB file is there before starting
             raise FileNotFoundError(f"DB file '{DB_FILE}' missing. Run tests from project root?")
         try:
             if cls.conn is None: # Only connect if not already connected
-                cls.conn = sqlite3.connect(DB_FILE)
+                # Copy the file DB into RAM so queries never touch the disk
+                src = sqlite3.connect(DB_FILE)
+                try:
+                    cls.conn = sqlite3.connect(":memory:")
+                    src.backup(cls.conn)
+                finally:
+                    src.close()
+                cls.conn.execute("PRAGMA query_only=1") # Tests only read
         except Exception as e:
             # Clean up connection if setup failed
             if cls.conn:
@@ -46,6 +63,14 @@ class TestSQLQueries(unittest.TestCase):
             cls.conn = None
             raise ConnectionError(f"DB connection failed during setup: {e}")
 
+        # Read every query file up front; missing ones are reported per test
+        cls.sql_texts = {}
+        for sql_filename in EXPECTED_COLUMNS:
+            filepath = os.path.join(SQL_FOLDER, sql_filename)
+            if os.path.exists(filepath):
+                with open(filepath, 'rb') as f:
+                    cls.sql_texts[sql_filename] = f.read().decode('utf-8')
+
     @classmethod
     def tearDownClass(cls):
         """Close DB connection after all tests here are done."""
@@ -62,27 +87,33 @@ class TestSQLQueries(unittest.TestCase):
     def _run_query_and_check(self, sql_filename, expect_results=True):
         """Helper: runs a query, checks columns, optionally checks for >0 results."""
         filepath = os.path.join(SQL_FOLDER, sql_filename)
-        self.assertTrue(os.path.exists(filepath), f"SQL file missing: {filepath}")
-
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                sql_query = f.read()
-        except Exception as e:
-            self.fail(f"Can't read SQL file {filepath}: {e}")
+        self.assertIn(sql_filename, self.sql_texts, f"SQL file missing: {filepath}")
+        sql_query = self.sql_texts[sql_filename]
 
         cursor = None
         try:
             cursor = self.conn.cursor()
+            # Run the raw query for its columns: wrapping it in a subquery would
+            # rename duplicate columns ('a' -> 'a:1'), and executing it steps the
+            # statement so runtime errors surface. Rows are never fetched.
             cursor.execute(sql_query)
-            first_row = cursor.fetchone() # Try getting one row
+            description = cursor.description
+
+            first_row = None
+            if expect_results:
+                cursor.execute(limit_query(sql_query, 1))
+                first_row = cursor.fetchone() # Try getting one row
 
             # Check 1: Did it return anything? (Only if expected)
             if expect_results:
                 self.assertIsNotNone(first_row, f"Query {sql_filename}: expected results, got none.")
             
             # Check 2: Does it have the right columns?
-            if cursor.description:
-                 actual_cols = [desc[0] for desc in cursor.description]
+            if description:
+                 cache_key = (sql_filename, sql_query)
+                 actual_cols = _COL_CACHE.get(cache_key)
+                 if actual_cols is None:
+                     actual_cols = _COL_CACHE[cache_key] = [desc[0] for desc in description]
                  expected_cols = EXPECTED_COLUMNS.get(sql_filename)
                  self.assertIsNotNone(expected_cols, f"No expected columns defined for {sql_filename} in test script.")
                  # Check if column names match (order matters with assertListEqual)